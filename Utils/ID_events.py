@@ -1,72 +1,69 @@
-import csv
+import os
 import numpy as np
-from Utils.event_filter import load_variables_from_npz
+from functools import lru_cache
+from Utils.npz_io import load_variables_from_npz
+from Utils.mask_kernels import cc_flavor_mask
 
 
 
 def save_ID_event(folder_path, features_to_load):
     data = load_variables_from_npz(folder_path, features_to_load)
 
-    cc_true = data["is_cc"] == 1
-    cc_false = data["is_cc"] == 0
+    # One fused pass per selection instead of separate compare/AND temporaries.
+    # Selections are sparse (tau CC especially): convert each mask to indices
+    # right away and gather every field with the shared index array
+    idx_nc = np.flatnonzero(cc_flavor_mask(data["is_cc"], data["in_neutrino_pdg"], 0))
+    idx_e = np.flatnonzero(cc_flavor_mask(data["is_cc"], data["in_neutrino_pdg"], 1, 12))
+    idx_mu = np.flatnonzero(cc_flavor_mask(data["is_cc"], data["in_neutrino_pdg"], 1, 14))
+    idx_tau = np.flatnonzero(cc_flavor_mask(data["is_cc"], data["in_neutrino_pdg"], 1, 16))
 
-    nu_tau = data["in_neutrino_pdg"] == 16 
-    nu_mu = data["in_neutrino_pdg"] == 14
-    nu_e = data["in_neutrino_pdg"] == 12
+    run_number_nc = data["run_number"][idx_nc]
+    event_id_nc = data["event_id"][idx_nc]
 
-    nc = cc_false
-    cc_nu_e = cc_true & nu_e
-    cc_nu_mu = cc_true & nu_mu
-    cc_nu_tau = cc_true & nu_tau
+    run_number_e = data["run_number"][idx_e]
+    event_id_e = data["event_id"][idx_e]
 
-    run_number_nc = data["run_number"][nc]
-    event_id_nc = data["event_id"][nc]
+    run_number_mu = data["run_number"][idx_mu]
+    event_id_mu = data["event_id"][idx_mu]
 
-    run_number_e = data["run_number"][cc_nu_e]
-    event_id_e = data["event_id"][cc_nu_e]
+    run_number_tau = data["run_number"][idx_tau]
+    event_id_tau = data["event_id"][idx_tau]
 
-    run_number_mu = data["run_number"][cc_nu_mu]
-    event_id_mu = data["event_id"][cc_nu_mu]
+    # Save the data to a space-separated file, padding the shorter columns with 0
+    columns = [run_number_e, event_id_e, run_number_mu, event_id_mu,
+               run_number_tau, event_id_tau, run_number_nc, event_id_nc]
+    max_length = max(len(col) for col in columns)
+    out = np.zeros((max_length, len(columns)), dtype=np.int64)
+    for i, col in enumerate(columns):
+        out[:len(col), i] = col
 
-    run_number_tau = data["run_number"][cc_nu_tau]
-    event_id_tau = data["event_id"][cc_nu_tau]
+    np.savetxt('id_events.txt', out, fmt='%d', delimiter=' ',
+               header='Run_e EventID_e Run_mu EventID_mu Run_tau EventID_tau Run_nc EventID_nc', comments='')
 
-    # Save the data to a CSV file
-    with open('id_events.txt', 'w', newline='') as csvfile:
-        writer = csv.writer(csvfile, delimiter=' ')
-
-        # Write the header (column names)
-        writer.writerow(['Run_e', 'EventID_e', 'Run_mu', 'EventID_mu', 'Run_tau', 'EventID_tau'])
-
-        # Make sure all arrays are the same length (use zip to align them)
-        max_length = max(len(run_number_e), len(run_number_mu), len(run_number_tau), len(event_id_nc))
-        for i in range(max_length):
-            run_e = run_number_e[i] if i < len(run_number_e) else "000"
-            event_e = event_id_e[i] if i < len(event_id_e) else "000"
-
-            run_mu = run_number_mu[i] if i < len(run_number_mu) else "000"
-            event_mu = event_id_mu[i] if i < len(event_id_mu) else "000"
-
-            run_tau = run_number_tau[i] if i < len(run_number_tau) else "000"
-            event_tau = event_id_tau[i] if i < len(event_id_tau) else "000"
-
-            run_nc = run_number_nc[i] if i < len(run_number_nc) else "000"
-            event_nc = event_id_nc[i] if i < len(event_id_nc) else "000"
+    print("File 'id_events.txt' has been saved.")
 
-            # Write the row with space-separated values
-            writer.writerow([int(run_e), int(event_e), int(run_mu), int(event_mu), int(run_tau), int(event_tau), int(run_nc), int(event_nc)])
 
-    print("File 'id_events.txt' has been saved.")
 
 
+@lru_cache(maxsize=8)
+def _load_id_table(filename, mtime_ns):
+    """Parses id_events.txt into an (N, 8) int64 table, cached until the file is modified."""
+    table = np.loadtxt(filename, dtype=np.int64, skiprows=1, ndmin=2)
+    if table.size == 0:
+        # Header-only file (nothing selected)
+        return np.empty((0, 8), dtype=np.int64)
+    if table.shape[1] != 8:
+        raise ValueError(f"{filename}: expected 8 columns (run/event pairs for e, mu, tau, NC), got {table.shape[1]}")
+    return table
 
 
 def get_event_ID(is_cc, is_nu_e, is_nu_mu, is_nu_tau, filename='id_events.txt'):
+    # Column pairs in the order written by save_ID_event
     neutrino_map = {
-        "NC": 0,
-        "e": 1,
-        "mu": 2,
-        "tau": 3
+        "e": 0,
+        "mu": 1,
+        "tau": 2,
+        "NC": 3
     }
     
     neutrino_type = "e" if is_cc and is_nu_e else \
@@ -74,24 +71,16 @@ def get_event_ID(is_cc, is_nu_e, is_nu_mu, is_nu_tau, filename='id_events.txt'):
                     "tau" if is_cc and is_nu_tau else "NC"
 
     
-    events_id = []
-    with open(filename, 'r') as f:
-        next(f)  # Skip the header
-        
-        for line in f:
-            parts = line.strip().split()
-            
-            if len(parts) == 8:
-                run_nc, event_nc, run_e, event_e, run_mu, event_mu, run_tau, event_tau = map(int, parts)
-                events_id.append((run_nc, event_nc, run_e, event_e, run_mu, event_mu, run_tau, event_tau))
-            else:
-                print(f"Skipping malformed line: {line.strip()}")
-    
-    index = neutrino_map[neutrino_type] * 2  # Get index corresponding to neutrino type
-    
-    file_list = [f"{event[index]}_{event[index + 1]}.npz" if event[index] != 0 else None for event in events_id]
+    # Absolute path as cache key: the default filename is relative to the working directory
+    filename = os.path.abspath(filename)
+    table = _load_id_table(filename, os.stat(filename).st_mtime_ns)
+
+    col = neutrino_map[neutrino_type] * 2  # Get index corresponding to neutrino type
+    runs = table[:, col]
+    events = table[:, col + 1]
+    filled = runs != 0  # Shorter columns are padded with 0
     
-    return [f for f in file_list if f is not None]
+    return [f"{run}_{event}.npz" for run, event in zip(runs[filled], events[filled])]
 
 
 # MORE EASY VERSION 
@@ -122,9 +111,11 @@ def get_ID(folder_path, is_cc, is_nu_e, is_nu_mu, is_nu_tau):
     cc_filter = (data["is_cc"] == is_cc)
 
     # Filter neutrino types based on user selection
-    nu_e_filter = (data["in_neutrino_pdg"] == 12) | (data["in_neutrino_pdg"] == -12) 
-    nu_mu_filter = (data["in_neutrino_pdg"] == 14) | (data["in_neutrino_pdg"] == -14)
-    nu_tau_filter = (data["in_neutrino_pdg"] == 16) | (data["in_neutrino_pdg"] == -16) 
+    # |pdg| is computed once and shared by the three flavours (neutrinos and antineutrinos)
+    abs_pdg = np.abs(data["in_neutrino_pdg"])
+    nu_e_filter = abs_pdg == 12
+    nu_mu_filter = abs_pdg == 14
+    nu_tau_filter = abs_pdg == 16
 
     # Combine the filters
     event_filter = cc_filter & (nu_e_filter | nu_mu_filter | nu_tau_filter)
@@ -1,76 +1,54 @@
 import numpy as np
 import os
-from tqdm import tqdm
-from multiprocessing import Pool
 from matplotlib import pyplot as plt
+from Utils.npz_io import load_variables_from_npz
+from Utils.mask_kernels import cc_flavor_mask
 
 
-# Function to load multiple variables from a .npz file
-def load_variables(file_variables_tuple):
-    """Loads the specified variables from a .npz file."""
-    file, variable_names = file_variables_tuple
-    try:
-        with np.load(file) as data:
-            return {var: data[var] if var in data else None for var in variable_names}
-    except Exception as e:
-        print(f"Error loading {file}: {e}")
-        return {var: None for var in variable_names}
+# |PDG code| of the incoming neutrino for each flavour
+_FLAVOR_PDG = {'e': 12, 'mu': 14, 'tau': 16}
 
-# Main function to extract multiple variables
-def load_variables_from_npz(folder_path, variable_names, num_workers=28, num_files=None, file_selected=None):
-    """
-    Load multiple variables from .npz files using multiprocessing.
 
+def create_flavor_masked_dict(data_filter, variables_to_extract, folder_path, is_cc, flavor=None, num_workers=28):
+    """
+    Selects the events with the given interaction type and neutrino flavour and loads their variables.
+    
+    Parameters:
+    data_filter (dict): The input data containing "is_cc", "in_neutrino_pdg", "run_number" and "event_id".
+    variables_to_extract (list): Variables to load for the selected events.
+    folder_path (str): Folder containing the per-event .npz files.
+    is_cc (int): 1 for charged current (CC), 0 for neutral current (NC).
+    flavor (str, optional): 'e', 'mu' or 'tau' to select one neutrino flavour, None for all.
+    
     Returns:
-        dict: A dictionary where keys are variable names and values are NumPy arrays.
+    dict: The loaded variables of the selected events, plus their "run_number" and "event_id".
     """
+    mask = cc_flavor_mask(data_filter["is_cc"], data_filter["in_neutrino_pdg"], is_cc,
+                          _FLAVOR_PDG[flavor] if flavor is not None else None)
 
-    # Get list of .npz files
-    file_list = [os.path.join(folder_path, f) for f in os.listdir(folder_path) if f.endswith('.npz')]
-   
-
-    if num_files is not None:
-        file_list = file_list[:num_files]  # Limit to requested files
-
-    if file_selected is not None:
-        # Use list comprehension to select files based on indices in file_selected
-        file_list = file_selected
-
-    # Prepare arguments for multiprocessing
-    file_variables_tuples = [(file, variable_names) for file in file_list]
-
-    # Use multiprocessing
-    num_workers = min(num_workers, os.cpu_count() or 1)
-    with Pool(processes=num_workers) as pool:
-        data_list = list(tqdm(pool.imap(load_variables, file_variables_tuples), total=len(file_list), desc="Processing files"))
-
-    # Convert list of dictionaries into a dictionary of lists
-    data_dict = {var: [] for var in variable_names}
-    for entry in data_list:
-        for var in variable_names:
-            if entry[var] is not None:
-                data_dict[var].append(entry[var])
+    idx = np.flatnonzero(mask)
+    dict_selected = {
+        "run_number": data_filter["run_number"][idx],
+        "event_id": data_filter["event_id"][idx]
+    }
 
-    # Convert lists to NumPy arrays
-    for var in data_dict:
-        try:
-            # If all elements have the same shape, create a standard NumPy array
-            sample_shape = set(arr.shape for arr in data_dict[var] if arr is not None)
-            if len(sample_shape) == 1:
-                data_dict[var] = np.array(data_dict[var], dtype=np.float32)
-            else:
-                # Store variable-length arrays as dtype=object
-                data_dict[var] = np.array(data_dict[var], dtype=object)
-        except Exception as e:
-            print(f"Error processing variable {var}: {e}")
+    file_names_selected = [os.path.join(folder_path, "{}_{}.npz".format(int(run_number), int(event_id))) for run_number, event_id in zip(dict_selected["run_number"], dict_selected["event_id"])]
+    
+    #now load the variables for the selected events
+    data_filtered = load_variables_from_npz(folder_path, variables_to_extract, file_selected=file_names_selected, num_workers=num_workers, num_files=None)
 
-    return data_dict
+    #concatenate the run_number and event_id to the data_selected
+    data_filtered["run_number"] = dict_selected["run_number"]
+    data_filtered["event_id"] = dict_selected["event_id"]
 
+    
+    return data_filtered
 
 
 def create_masked_dict(data_filter,variables_to_extract,folder_path, is_cc, is_nu_e, is_nu_mu, is_nu_tau, num_workers=28):
     """
     Filters the data based on the given conditions and returns a masked dictionary.
+    Wrapper around create_flavor_masked_dict taking one 0/1 flag per neutrino flavour.
     
     Parameters:
     data_filter (pd.DataFrame): The input data containing neutrino events.
@@ -93,32 +71,9 @@ def create_masked_dict(data_filter,variables_to_extract,folder_path, is_cc, is_n
     
     # --------------
 
+    # The flavour only applies to CC events, NC selects all flavours
+    flavor = None
     if is_cc == 1:
-        if is_nu_e:
-            mask = (data_filter["is_cc"] == 1) & ((data_filter["in_neutrino_pdg"] == 12) | (data_filter["in_neutrino_pdg"] == -12))
-        elif is_nu_mu:
-            mask = (data_filter["is_cc"] == 1) & ((data_filter["in_neutrino_pdg"] == 14) | (data_filter["in_neutrino_pdg"] == -14))
-        elif is_nu_tau:
-            mask = (data_filter["is_cc"] == 1) & ((data_filter["in_neutrino_pdg"] == 16) | (data_filter["in_neutrino_pdg"] == -16))
-        else:
-            mask = (data_filter["is_cc"] == 1)
-    else:
-        mask = (data_filter["is_cc"] == 0)
-
-    dict_selected = {
-        "run_number": data_filter["run_number"][mask],
-        "event_id": data_filter["event_id"][mask]
-    }
-
-    file_names_selected = [os.path.join(folder_path, "{}_{}.npz".format(int(run_number), int(event_id))) for run_number, event_id in zip(dict_selected["run_number"], dict_selected["event_id"])]
-    
-    #now load the variables for the selected events
-    data_filtered = load_variables_from_npz(folder_path, variables_to_extract, file_selected=file_names_selected, num_workers=num_workers, num_files=None)
+        flavor = 'e' if is_nu_e else 'mu' if is_nu_mu else 'tau' if is_nu_tau else None
 
-    #concatenate the run_number and event_id to the data_selected
-    data_filtered["run_number"] = dict_selected["run_number"]
-    data_filtered["event_id"] = dict_selected["event_id"]
-
-    
-    return data_filtered
-    
\ No newline at end of file
+    return create_flavor_masked_dict(data_filter, variables_to_extract, folder_path, is_cc, flavor, num_workers=num_workers)
@@ -0,0 +1,45 @@
+"""
+Description:
+    Event-selection masks on the per-event is_cc / in_neutrino_pdg arrays.
+    The CC/flavour conjunction runs as a single parallel Numba loop when Numba
+    is available, otherwise as a fused numexpr expression or plain NumPy.
+"""
+
+import numpy as np
+
+try:
+    from numba import njit, prange
+except ImportError:  # Fall back to numexpr / NumPy
+    njit = None
+
+try:
+    import numexpr as ne
+except ImportError:  # Fall back to plain NumPy expressions
+    ne = None
+
+
+if njit is not None:
+    @njit(parallel=True, boundscheck=False, cache=True)
+    def _cc_flavor_mask_kernel(is_cc, pdg, want_cc, flavor):
+        out = np.empty(is_cc.shape[0], dtype=np.bool_)
+        for i in prange(is_cc.shape[0]):
+            out[i] = (is_cc[i] == want_cc) and (pdg[i] == flavor or pdg[i] == -flavor)
+        return out
+
+
+def cc_flavor_mask(is_cc, pdg, want_cc, flavor=None):
+    """
+    Boolean mask selecting events with is_cc == want_cc and, if flavor is given,
+    |pdg| == flavor (12, 14 or 16), built in a single pass over both arrays.
+    """
+    if flavor is None:
+        return np.asarray(is_cc == want_cc, dtype=bool)
+    # Variables missing from every file come back as empty dtype=object arrays,
+    # which neither Numba nor numexpr can type: use plain NumPy for those
+    numeric = len(is_cc) > 0 and is_cc.dtype != object and pdg.dtype != object
+    if numeric and njit is not None:
+        return _cc_flavor_mask_kernel(np.ascontiguousarray(is_cc), np.ascontiguousarray(pdg), want_cc, flavor)
+    if numeric and ne is not None:
+        return ne.evaluate("(is_cc == want_cc) & (abs(pdg) == flavor)",
+                           local_dict={'is_cc': is_cc, 'pdg': pdg, 'want_cc': want_cc, 'flavor': flavor})
+    return np.asarray((is_cc == want_cc) & (np.abs(pdg) == flavor), dtype=bool)
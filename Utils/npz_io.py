@@ -0,0 +1,268 @@
+"""
+Description:
+    Parallel loading of variables from per-event .npz files.
+"""
+
+import atexit
+import numpy as np
+import os
+import warnings
+import zipfile
+from functools import lru_cache
+from tqdm import tqdm
+from multiprocessing import Pool
+from concurrent.futures import ThreadPoolExecutor
+
+
+# Worker pool kept alive across calls, so repeated loads (e.g. from a notebook)
+# do not pay the process start-up cost every time
+_POOL = None
+_POOL_SIZE = None
+_CPU_COUNT = os.cpu_count() or 1
+
+
+def _get_pool(num_workers):
+    """Returns the shared worker pool, (re)creating it if the requested size changed."""
+    global _POOL, _POOL_SIZE
+    if _POOL is None or _POOL_SIZE != num_workers:
+        if _POOL is not None:
+            _POOL.terminate()
+        _POOL = Pool(processes=num_workers)
+        _POOL_SIZE = num_workers
+    return _POOL
+
+
+def _discard_pool():
+    """Terminates the shared pool, dropping any task still queued on it."""
+    global _POOL, _POOL_SIZE
+    if _POOL is not None:
+        _POOL.terminate()
+    _POOL = None
+    _POOL_SIZE = None
+
+
+atexit.register(_discard_pool)
+
+
+@lru_cache(maxsize=32)
+def _list_npz_files(folder_path, mtime_ns):
+    return tuple(sorted(os.path.join(folder_path, f) for f in os.listdir(folder_path) if f.endswith('.npz')))
+
+
+def list_npz_files(folder_path):
+    """
+    Lists the .npz files in a folder sorted by name, cached until the folder is modified.
+    Sorting makes `num_files` pick the same files on every run.
+    """
+    return list(_list_npz_files(folder_path, os.stat(folder_path).st_mtime_ns))
+
+
+def is_stored_npz(path):
+    """
+    Returns True if every member of the .npz file is stored uncompressed (written with np.savez),
+    which is required by read_npz_members. Files written with np.savez_compressed return False.
+    """
+    with zipfile.ZipFile(path) as zf:
+        return all(info.compress_type == zipfile.ZIP_STORED for info in zf.infolist())
+
+
+class CompressedNpzError(ValueError):
+    """Raised by read_npz_members for members written with np.savez_compressed."""
+
+
+# Members smaller than this are read into memory, larger ones are memory-mapped
+_MMAP_MIN_BYTES = 1 << 20
+
+
+# Function to read several arrays stored inside a .npz file without decompressing the archive
+def read_npz_members(path, names):
+    """
+    Returns {name: array} for the members of the .npz file `path` listed in `names`,
+    skipping names the archive does not have.
+
+    np.load ignores mmap_mode for .npz archives, so the arrays are located by hand:
+    the archive is opened once, the ZIP local header gives the start of each member,
+    and the .npy header inside it gives dtype, shape and the offset of the raw data.
+    Small members (per-event scalars) are read straight into memory, large ones
+    are returned as read-only np.memmap views.
+    Only works for archives written with np.savez (stored): raises CompressedNpzError
+    for members written with np.savez_compressed.
+    """
+    arrays = {}
+    with open(path, 'rb') as f:
+        infos = {info.filename: info for info in zipfile.ZipFile(f).infolist()}
+
+        for name in names:
+            info = infos.get(name + '.npy')
+            if info is None:
+                continue
+            if info.compress_type != zipfile.ZIP_STORED:
+                raise CompressedNpzError(f"{path}: member '{name}' is compressed, "
+                                         "save with np.savez instead of np.savez_compressed")
+
+            # Local file header: 30 fixed bytes, then file name and extra field
+            f.seek(info.header_offset)
+            local_header = f.read(30)
+            name_len = int.from_bytes(local_header[26:28], 'little')
+            extra_len = int.from_bytes(local_header[28:30], 'little')
+            f.seek(info.header_offset + 30 + name_len + extra_len)
+
+            # .npy header
+            version = np.lib.format.read_magic(f)
+            if version == (1, 0):
+                shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+            else:
+                shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+            if dtype.hasobject:
+                raise ValueError(f"{path}: member '{name}' holds Python objects and cannot be memory-mapped")
+
+            order = 'F' if fortran_order else 'C'
+            nbytes = int(np.prod(shape)) * dtype.itemsize
+            if nbytes < _MMAP_MIN_BYTES:
+                arrays[name] = np.frombuffer(f.read(nbytes), dtype=dtype).reshape(shape, order=order)
+            else:
+                arrays[name] = np.memmap(path, dtype=dtype, shape=shape, mode='r', offset=f.tell(), order=order)
+
+    return arrays
+
+
+def mmap_npz_member(path, name):
+    """Returns the array `name` stored in the .npz file `path` (see read_npz_members), or None if missing."""
+    return read_npz_members(path, [name]).get(name)
+
+
+# Function to load multiple variables from a .npz file
+def load_variables(file_variables_tuple, use_mmap=True):
+    """
+    Loads the specified variables from a .npz file as contiguous arrays, keeping their stored dtype.
+    Members are read with read_npz_members unless `use_mmap` is False; files written with
+    np.savez_compressed are read with np.load instead.
+    Returns a list of (variable name, array) pairs for the variables present in the file.
+    """
+    file, variable_names = file_variables_tuple
+    try:
+        if use_mmap:
+            try:
+                arrays = read_npz_members(file, variable_names)
+                return [(var, np.asarray(arrays[var], order='C')) for var in variable_names if var in arrays]
+            except CompressedNpzError:
+                pass  # This file is compressed: decompress it with np.load
+
+        with np.load(file) as data:
+            return [(var, np.asarray(data[var], order='C')) for var in variable_names if var in data.files]
+    except Exception as e:
+        print(f"Error loading {file}: {e}", flush=True)  # Workers of the shared pool are never flushed on exit
+        return []
+
+
+def load_variables_indexed(args):
+    """
+    Same as load_variables, but passes the file index through so results can arrive out of order.
+    Arrays are cast to the dtype given in `dtype_hint`, if any, before being pickled back.
+    """
+    i, file, variable_names, use_mmap, dtype_hint = args
+    entry = load_variables((file, variable_names), use_mmap=use_mmap)
+    if dtype_hint:
+        entry = [(var, arr.astype(dtype_hint[var], copy=False) if var in dtype_hint else arr) for var, arr in entry]
+    return i, entry
+
+# Main function to extract multiple variables
+def load_variables_from_npz(folder_path, variable_names, num_workers=28, num_files=None, file_selected=None, dtype_hint=None):
+    """
+    Load multiple variables from .npz files using multiprocessing.
+    Variables keep the dtype they are stored with (e.g. integer run_number/event_id)
+    unless a dtype is forced for them in `dtype_hint` ({variable name: dtype}).
+
+    Returns:
+        dict: A dictionary where keys are variable names and values are NumPy arrays.
+    """
+
+    if file_selected is not None:
+        file_list = file_selected
+    else:
+        # Get list of .npz files
+        file_list = list_npz_files(folder_path)
+
+        if num_files is not None:
+            file_list = file_list[:num_files]  # Limit to requested files
+
+    dtype_hint = dtype_hint or {}
+
+    # The memory-mapped fast path needs uncompressed archives. Check the first file to
+    # warn once and skip the fast path for the whole folder; workers still fall back
+    # to np.load for any other compressed file
+    try:
+        use_mmap = not file_list or is_stored_npz(file_list[0])
+    except (OSError, zipfile.BadZipFile):
+        use_mmap = True  # Unreadable file: the workers report it
+    if not use_mmap:
+        warnings.warn(f"{file_list[0]} is compressed (np.savez_compressed): falling back to np.load, "
+                      "which decompresses every file in full. Save with np.savez to enable memory mapping.")
+
+    # Prepare arguments for multiprocessing; the index lets results arrive out of order
+    file_variables_tuples = [(i, file, variable_names, use_mmap, dtype_hint) for i, file in enumerate(file_list)]
+
+    # Use multiprocessing
+    num_workers = min(num_workers, _CPU_COUNT)
+    chunksize = max(1, len(file_list) // (num_workers * 8))
+
+    # Each file's arrays go straight into slot i of one preallocated array per
+    # variable, allocated when the first array of that variable arrives.
+    # `loaded` records which slots were filled (a file may lack a variable) and
+    # `n_loaded` counts them, so the final pass needs no scan to decide anything.
+    # The shape of each new array is only compared with the preallocated one.
+    data_dict = {var: None for var in variable_names}
+    loaded = {var: np.zeros(len(file_list), dtype=bool) for var in variable_names}
+    n_loaded = {var: 0 for var in variable_names}
+    ragged = set()  # Variables whose shape changes between files, stored as object arrays
+
+    def store(i, entry):
+        for var, arr in entry:
+            loaded[var][i] = True
+            n_loaded[var] += 1
+            if var in ragged:
+                data_dict[var][i] = arr
+            elif data_dict[var] is None:
+                data_dict[var] = np.empty((len(file_list),) + arr.shape, dtype=arr.dtype)
+                data_dict[var][i] = arr
+            elif data_dict[var].shape[1:] != arr.shape:
+                # Switch to a dtype=object array holding one array per file
+                stacked = data_dict[var]
+                data_dict[var] = np.empty(len(file_list), dtype=object)
+                for j in np.flatnonzero(loaded[var]):
+                    data_dict[var][j] = stacked[j]
+                data_dict[var][i] = arr
+                ragged.add(var)
+            else:
+                if not np.can_cast(arr.dtype, data_dict[var].dtype):
+                    # Files disagree on the dtype: promote what is stored so far
+                    data_dict[var] = data_dict[var].astype(np.result_type(data_dict[var], arr))
+                data_dict[var][i] = arr
+
+    # Results are stored on a background thread so the main thread keeps
+    # draining the pool while the previous ones are copied in
+    pool = _get_pool(num_workers)
+    with ThreadPoolExecutor(max_workers=1) as collector:
+        try:
+            futures = [collector.submit(store, i, entry)
+                       for i, entry in tqdm(pool.imap_unordered(load_variables_indexed, file_variables_tuples, chunksize=chunksize),
+                                            total=len(file_list), desc="Processing files")]
+        except BaseException:
+            # Interrupted (Ctrl-C or error): the unfinished tasks would stay queued
+            # on the shared pool and delay the next call, so kill the workers
+            _discard_pool()
+            raise
+    for future in futures:
+        future.result()
+
+    for var in variable_names:
+        try:
+            if data_dict[var] is None:
+                data_dict[var] = np.array([], dtype=object)
+            elif n_loaded[var] < len(data_dict[var]):
+                # Drop the slots of files where the variable was missing
+                data_dict[var] = data_dict[var][loaded[var]]
+        except Exception as e:
+            print(f"Error processing variable {var}: {e}")
+
+    return data_dict
@@ -101,11 +101,18 @@ def plot_hits_3D(x, y, z, q, q_mode='categorical', primary_vertex=None, lepton_d
 
     # CATEGORICAL MODE (0 = Ghost, 1 = EM, 2 = Hadronic)
     if q_mode == 'categorical':
-        q = np.argmax(q, axis = 1)
-        color_map = {0: 'gray', 1: 'blue', 2: 'red'}
-        size_map = {0: s * 1.2, 1: s * 1.4, 2: s * 1.8}  # Adjust size: FOR NOW THE SAME
-        colors = [color_map[val] if val in color_map else 'black' for val in q]
-        sizes = [size_map[val] if val in size_map else s for val in q]
+        # q is either one-hot/score columns (N, 3) or already the category IDs (N,)
+        if q.ndim == 2:
+            cls = q.argmax(axis=1)
+        else:
+            # Validate in the source dtype: casting first would wrap/truncate (257 -> 1, 1.7 -> 1)
+            valid = (q >= 0) & (q <= 2) & (q == np.floor(q))
+            cls = np.where(valid, q, 3).astype(np.intp)
+        # Last entry is the fallback for unknown categories
+        color_palette = np.array(['gray', 'blue', 'red', 'black'])
+        size_palette = np.array([s * 1.2, s * 1.4, s * 1.8, s], dtype=np.float32)  # Adjust size: FOR NOW THE SAME
+        colors = color_palette[cls]
+        sizes = size_palette[cls]
 
         fig.add_trace(go.Scatter3d(
             x=z, y=x, z=y,
@@ -117,10 +124,10 @@ def plot_hits_3D(x, y, z, q, q_mode='categorical', primary_vertex=None, lepton_d
     # BINARY MODE (Primary lepton vs Rest)
     elif q_mode == 'binary':
         print(q.shape)
-        mask_lepton = q[:, 0] == 1
-        mask_rest = q[:, 0] == 0
+        # Labels are 0/1: one cast gives the lepton mask, the rest is its complement
+        mask_lepton = q[:, 0].astype(bool, copy=False)
 
-        if mask_lepton.sum() > 0:
+        if mask_lepton.any():
             fig.add_trace(go.Scatter3d(
                 x=z[mask_lepton], y=x[mask_lepton], z=y[mask_lepton],
                 mode='markers',
@@ -128,7 +135,8 @@ def plot_hits_3D(x, y, z, q, q_mode='categorical', primary_vertex=None, lepton_d
                 name='Primary Lepton'
             ))
 
-        if mask_rest.sum() > 0:
+        if not mask_lepton.all():
+            mask_rest = ~mask_lepton
             fig.add_trace(go.Scatter3d(
                 x=z[mask_rest], y=x[mask_rest], z=y[mask_rest],
                 mode='markers',
@@ -140,25 +148,24 @@ def plot_hits_3D(x, y, z, q, q_mode='categorical', primary_vertex=None, lepton_d
     # ENERGY MODE (Color by sum of second and third column of q)
     elif q_mode == 'energy':
         energy_vals = q[:, 1] + q[:, 2]  # Sum second and third column
-        min_energy, max_energy = np.min(energy_vals), np.max(energy_vals)
-        
-        # Normalize between 0 and 1
-        norm_energy = (energy_vals - min_energy) / (max_energy - min_energy + 1e-6)
+        min_energy = np.min(energy_vals)
+        max_energy = min_energy + max(np.ptp(energy_vals), 1e-6)  # Keep cmin < cmax when all energies are equal
 
-        # Get colors from the Viridis colormap
+        # Viridis colormap, applied by Plotly itself on the raw energy values
         color_scale = px.colors.sequential.Viridis[::-1]
-        colors = [color_scale[int(val * (len(color_scale) - 1))] for val in norm_energy]
 
         fig.add_trace(go.Scatter3d(
                 x=z, y=x, z=y,
                 mode='markers',
                 marker=dict(
                     size=s, 
-                    color=norm_energy,  # Use normalized energy values for color mapping
+                    color=energy_vals,  # Plotly maps [cmin, cmax] onto the color scale
+                    cmin=min_energy,
+                    cmax=max_energy,
                     colorscale=color_scale,
                     colorbar=dict(
                         title='Energy',  # Title for the color scale
-                        tickvals=[0, 1],  # Show color scale ticks at 0 and 1
+                        tickvals=[min_energy, max_energy],  # Show color scale ticks at min and max
                         ticktext=[f'{min_energy:.2f}', f'{max_energy:.2f}']  # Display min and max energy
                     ),
                     opacity=0.7
@@ -251,12 +258,13 @@ def plot_hits(x, y, z, q, q_mode='categorical', primary_vertex=None, lepton_dire
         ]
     
     elif q_mode == 'binary':
-        mask_lepton = q[:, 0] == 1
-        mask_rest = q[:, 0] == 0
+        # Labels are 0/1: one cast gives the lepton mask, the rest is its complement
+        mask_lepton = q[:, 0].astype(bool, copy=False)
 
-        if mask_lepton.sum() > 0:
+        if mask_lepton.any():
             ax.scatter(z[mask_lepton], x[mask_lepton], y[mask_lepton], s=s, c="orange", marker='o', alpha=1.0, label='Primary lepton', zorder=3)
-        if mask_rest.sum() > 0:
+        if not mask_lepton.all():
+            mask_rest = ~mask_lepton
             ax.scatter(z[mask_rest], x[mask_rest], y[mask_rest], s=s, c="black", marker='o', alpha=0.1, label='Rest', zorder=2)
 
         legend_elements = [